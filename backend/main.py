@@ -3,12 +3,15 @@ DocuLens API — Image/PDF to Document converter.
 Supports multi-file upload, PDF input, and DOCX/PDF/TXT output formats.
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 import uvicorn
+import asyncio
 import os
-from typing import List
+import re
+from typing import List, Union
 from dotenv import load_dotenv
 from services.ocr import OCRService
 from services.llm import LLMService
@@ -17,7 +20,23 @@ from services.pdf_extractor import PDFExtractorService
 
 load_dotenv()
 
-app = FastAPI(title="DocuLens — AI Document Converter")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the services once per worker and shares them via app.state.
+    Run under gunicorn with --preload so the heavy imports (PyMuPDF, OpenCV,
+    ReportLab, gRPC) are loaded once in the master and shared copy-on-write.
+    """
+    app.state.ocr_service = OCRService()
+    app.state.llm_service = LLMService()
+    app.state.doc_service = DocumentService()
+    app.state.pdf_extractor = PDFExtractorService()
+    yield
+    app.state.pdf_extractor.shutdown()
+
+
+app = FastAPI(title="DocuLens — AI Document Converter", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,17 +46,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-ocr_service = OCRService()
-llm_service = LLMService()
-doc_service = DocumentService()
-pdf_extractor = PDFExtractorService()
-
 # ── Constants ─────────────────────────────────────────────────────────
 
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
 ALLOWED_PDF_TYPE = "application/pdf"
 
+# Cap on concurrent outbound LLM calls per request (provider rate limits)
+MAX_CONCURRENT_BATCHES = 8
+
+# Pages below these sizes (cover/separator pages, stray OCR) have no
+# structure worth asking the LLM about and are passed through as paragraphs
+MIN_CHARS_FOR_LLM = 20
+MIN_WORDS_FOR_LLM = 5
+
+# Pages whose only text is a page number are dropped
+PAGE_NUMBER_RE = re.compile(r"^\s*(page\s+)?\d+\s*$", re.IGNORECASE)
+
 OUTPUT_FORMATS = {
     "docx": {
         "method": "generate_docx",
@@ -64,6 +88,7 @@ def read_root() -> dict[str, str]:
 
 @app.post("/convert")
 async def convert_files(
+    request: Request,
     files: List[UploadFile] = File(...),
     output_format: str = Query("docx", enum=["docx", "pdf", "txt"]),
 ) -> StreamingResponse:
@@ -79,21 +104,29 @@ async def convert_files(
     if output_format not in OUTPUT_FORMATS:
         raise HTTPException(status_code=400, detail=f"Unsupported format: {output_format}")
 
+    ocr_service: OCRService = request.app.state.ocr_service
+    llm_service: LLMService = request.app.state.llm_service
+    doc_service: DocumentService = request.app.state.doc_service
+    pdf_extractor: PDFExtractorService = request.app.state.pdf_extractor
+
     # ── 1. Collect all images (expand PDFs into page images) ──────────
     image_buffers: List[bytes] = []
 
     for uploaded_file in files:
         content_type = uploaded_file.content_type or ""
-        raw_bytes = await uploaded_file.read()
 
         if content_type == ALLOWED_PDF_TYPE:
+            # Render straight from the spooled upload instead of reading it into memory
             print(f"[PDF] Extracting pages from: {uploaded_file.filename}")
-            page_images = pdf_extractor.extract_images(raw_bytes)
+            page_images = await asyncio.to_thread(
+                pdf_extractor.extract_images_from_file, uploaded_file.file
+            )
             image_buffers.extend(page_images)
             print(f"[PDF] Extracted {len(page_images)} page(s)")
 
         elif content_type in ALLOWED_IMAGE_TYPES:
-            image_buffers.append(raw_bytes)
+            # Vision takes image content as bytes, so images are read whole
+            image_buffers.append(await uploaded_file.read())
 
         else:
             raise HTTPException(
@@ -105,22 +138,52 @@ async def convert_files(
         raise HTTPException(status_code=400, detail="No valid files uploaded.")
 
     try:
-        # ── 2. OCR each image ─────────────────────────────────────────
-        merged_elements: list[dict] = []
+        # ── 2. OCR all images in batched Vision requests ─────────────
+        total = len(image_buffers)
+        print(f"[OCR] Processing {total} image(s)...")
+        raw_texts = await ocr_service.detect_text_batch(image_buffers)
+
+        # ── 3. Structure extraction via LLM, batched pages ───────────
+        # Each part is either a passthrough element for a near-empty page or
+        # a batch of consecutive pages for the LLM; parts keep page order.
+        parts: list[Union[dict, list[str]]] = []
+        pending: list[str] = []
+
+        for idx, raw_text in enumerate(raw_texts, 1):
+            text = raw_text.strip()
+            if not text:
+                print(f"[OCR] No text detected in image {idx}, skipping.")
+                continue
 
-        for idx, img_bytes in enumerate(image_buffers, 1):
-            print(f"[OCR] Processing image {idx}/{len(image_buffers)}...")
-            raw_text = await ocr_service.detect_text(img_bytes)
+            if PAGE_NUMBER_RE.match(text):
+                print(f"[OCR] Only a page number in image {idx}, skipping.")
+                continue
 
-            if not raw_text:
-                print(f"[OCR] No text detected in image {idx}, skipping.")
+            if len(text) < MIN_CHARS_FOR_LLM or len(text.split()) < MIN_WORDS_FOR_LLM:
+                print(f"[OCR] Too little text in image {idx} to structure, passing through.")
+                parts.extend(llm_service.batch_pages(pending))
+                pending = []
+                parts.append({"type": "paragraph", "text": text})
                 continue
 
-            # ── 3. Structure extraction via LLM ───────────────────────
-            print(f"[LLM] Extracting structure for image {idx}...")
-            structure = llm_service.extract_structure(raw_text)
-            elements = structure.get("elements", [])
-            merged_elements.extend(elements)
+            pending.append(raw_text)
+
+        parts.extend(llm_service.batch_pages(pending))
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+
+        async def process_part(part: Union[dict, list[str]]) -> list[dict]:
+            if isinstance(part, dict):
+                return [part]
+
+            async with semaphore:
+                print(f"[LLM] Extracting structure for {len(part)} page(s)...")
+                return [element async for element in llm_service.stream_structure_batch(part)]
+
+        results = await asyncio.gather(*(process_part(part) for part in parts))
+
+        # gather preserves input order, so pages stay in sequence
+        merged_elements: list[dict] = [el for elements in results for el in elements]
 
         if not merged_elements:
             raise HTTPException(
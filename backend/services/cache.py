@@ -0,0 +1,73 @@
+"""
+Structure cache — exact-match cache for LLM structure extraction results,
+keyed by a hash of the normalized OCR text.
+
+Uses Redis (redis.asyncio) when REDIS_URL is set, shared across uvicorn
+workers; otherwise an in-process LRU.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import hashlib
+import orjson
+import os
+import re
+
+
+class StructureCache:
+    """Caches parsed document structures by content hash."""
+
+    MAX_ENTRIES = 2048  # In-process LRU capacity
+    TTL_SECONDS = 86400  # Redis entry lifetime
+    KEY_PREFIX = "doculens:structure:"
+
+    _HSPACE_RE = re.compile(r"[ \t\f\v]+")
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._redis = None
+        self._redis_errors: tuple = ()
+
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            import redis.asyncio
+            self._redis = redis.asyncio.Redis.from_url(redis_url)
+            self._redis_errors = (redis.exceptions.RedisError,)
+
+    def key_for(self, raw_text: str) -> str:
+        """
+        Hashes the OCR text after collapsing insignificant whitespace, so
+        re-uploads with trivially different spacing still hit the cache.
+        Line breaks are kept since they carry layout information.
+        """
+        lines = (self._HSPACE_RE.sub(" ", line).strip() for line in raw_text.strip().splitlines())
+        normalized = "\n".join(line for line in lines if line)
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # The cache is optional: a Redis failure is logged and treated as a miss
+        if self._redis is not None:
+            try:
+                cached = await self._redis.get(self.KEY_PREFIX + key)
+            except self._redis_errors as e:
+                print(f"[CACHE] Redis get failed, treating as miss: {e}")
+                return None
+            return orjson.loads(cached) if cached is not None else None
+
+        structure = self._entries.get(key)
+        if structure is not None:
+            self._entries.move_to_end(key)
+        return structure
+
+    async def set(self, key: str, structure: Dict[str, Any]) -> None:
+        if self._redis is not None:
+            try:
+                await self._redis.setex(self.KEY_PREFIX + key, self.TTL_SECONDS, orjson.dumps(structure))
+            except self._redis_errors as e:
+                print(f"[CACHE] Redis set failed, skipping write: {e}")
+            return
+
+        self._entries[key] = structure
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.MAX_ENTRIES:
+            self._entries.popitem(last=False)
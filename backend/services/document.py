@@ -3,27 +3,127 @@ Document generation service — produces DOCX, PDF, and TXT output
 from a structured JSON document representation.
 """
 
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from fpdf import FPDF
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, ListFlowable, ListItem, Spacer
 from typing import Dict, Any, List
+from xml.sax.saxutils import escape
 import io
+import re
+import zipfile
+
+
+# ── DOCX skeleton ─────────────────────────────────────────────────────
+# Output is text-only (headings, paragraphs, lists), so the OOXML package
+# is written directly instead of building a python-docx tree. Only
+# word/document.xml varies per request.
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+DOCX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+<Override PartName="/word/numbering.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>
+</Types>"""
+
+DOCX_PACKAGE_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+DOCX_DOCUMENT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" Target="numbering.xml"/>
+</Relationships>"""
+
+DOCX_STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles xmlns:w="{_W_NS}">
+<w:docDefaults>
+<w:rPrDefault><w:rPr><w:rFonts w:ascii="Arial" w:hAnsi="Arial" w:eastAsia="Arial" w:cs="Arial"/><w:sz w:val="22"/><w:szCs w:val="22"/></w:rPr></w:rPrDefault>
+<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>
+</w:docDefaults>
+<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>
+<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/><w:pPr><w:keepNext/><w:spacing w:before="480" w:after="0"/><w:outlineLvl w:val="0"/></w:pPr><w:rPr><w:b/><w:color w:val="365F91"/><w:sz w:val="28"/><w:szCs w:val="28"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/><w:pPr><w:keepNext/><w:spacing w:before="200" w:after="0"/><w:outlineLvl w:val="1"/></w:pPr><w:rPr><w:b/><w:color w:val="4F81BD"/><w:sz w:val="26"/><w:szCs w:val="26"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Heading3"><w:name w:val="heading 3"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/><w:pPr><w:keepNext/><w:spacing w:before="200" w:after="0"/><w:outlineLvl w:val="2"/></w:pPr><w:rPr><w:b/><w:color w:val="4F81BD"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="ListBullet"><w:name w:val="List Bullet"/><w:basedOn w:val="Normal"/><w:pPr><w:numPr><w:numId w:val="1"/></w:numPr><w:contextualSpacing/></w:pPr></w:style>
+<w:style w:type="paragraph" w:styleId="ListNumber"><w:name w:val="List Number"/><w:basedOn w:val="Normal"/><w:pPr><w:numPr><w:numId w:val="2"/></w:numPr><w:contextualSpacing/></w:pPr></w:style>
+</w:styles>"""
+
+DOCX_NUMBERING = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:numbering xmlns:w="{_W_NS}">
+<w:abstractNum w:abstractNumId="0"><w:lvl w:ilvl="0"><w:start w:val="1"/><w:numFmt w:val="bullet"/><w:lvlText w:val="\u2022"/><w:lvlJc w:val="left"/><w:pPr><w:ind w:left="360" w:hanging="360"/></w:pPr></w:lvl></w:abstractNum>
+<w:abstractNum w:abstractNumId="1"><w:lvl w:ilvl="0"><w:start w:val="1"/><w:numFmt w:val="decimal"/><w:lvlText w:val="%1."/><w:lvlJc w:val="left"/><w:pPr><w:ind w:left="360" w:hanging="360"/></w:pPr></w:lvl></w:abstractNum>
+<w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>
+<w:num w:numId="2"><w:abstractNumId w:val="1"/></w:num>
+</w:numbering>"""
+
+DOCX_DOCUMENT_HEAD = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:document xmlns:w="{_W_NS}"><w:body>"""
+
+DOCX_DOCUMENT_TAIL = """<w:sectPr><w:pgSz w:w="12240" w:h="15840"/><w:pgMar w:top="1440" w:right="1440" w:bottom="1440" w:left="1440" w:header="720" w:footer="720" w:gutter="0"/></w:sectPr></w:body></w:document>"""
+
+DOCX_HEADING_STYLES = {"heading1": "Heading1", "heading2": "Heading2", "heading3": "Heading3"}
+
+# ── PDF styles ────────────────────────────────────────────────────────
+
+_PDF_BASE_STYLES = getSampleStyleSheet()
+
+PDF_BODY_STYLE = ParagraphStyle(
+    "DocuLensBody", parent=_PDF_BASE_STYLES["Normal"],
+    fontName="Helvetica", fontSize=11, leading=15, spaceAfter=6,
+)
+
+PDF_HEADING_STYLES = {
+    level: ParagraphStyle(
+        f"DocuLens{level.title()}", parent=_PDF_BASE_STYLES[level.title()],
+        fontName="Helvetica-Bold", fontSize=size, leading=size * 1.25,
+        spaceBefore=10, spaceAfter=6,
+    )
+    for level, size in (("heading1", 22), ("heading2", 18), ("heading3", 14))
+}
+
+# Characters not allowed in XML 1.0 (OCR output occasionally contains them)
+_XML_INVALID_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
 
 
 class DocumentService:
     """Generates output documents in multiple formats from structured JSON."""
 
+    # Per-request DEFLATE level for word/document.xml. Level 1 costs far
+    # less CPU than zlib's default 6 for a slightly larger file; the static
+    # template parts are compressed once, so they use the maximum level.
+    DOCX_COMPRESSLEVEL = 1
+    DOCX_TEMPLATE_COMPRESSLEVEL = 9
+
+    def __init__(self):
+        # The static DOCX parts never change, so they are compressed into a
+        # template package once; each request only appends word/document.xml.
+        self._docx_template = self._build_docx_template()
+
     # ── DOCX ──────────────────────────────────────────────────────────
 
+    def _build_docx_template(self) -> bytes:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(
+            buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=self.DOCX_TEMPLATE_COMPRESSLEVEL
+        ) as docx:
+            docx.writestr("[Content_Types].xml", DOCX_CONTENT_TYPES)
+            docx.writestr("_rels/.rels", DOCX_PACKAGE_RELS)
+            docx.writestr("word/_rels/document.xml.rels", DOCX_DOCUMENT_RELS)
+            docx.writestr("word/styles.xml", DOCX_STYLES)
+            docx.writestr("word/numbering.xml", DOCX_NUMBERING)
+        return buffer.getvalue()
+
     def generate_docx(self, structure: Dict[str, Any]) -> io.BytesIO:
         """Generates a DOCX file from the structured JSON data."""
-        doc = Document()
-
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Arial'
-        font.size = Pt(11)
+        body = io.StringIO()
+        body.write(DOCX_DOCUMENT_HEAD)
 
         elements = structure.get("elements", [])
 
@@ -31,38 +131,48 @@ class DocumentService:
             el_type = element.get("type", "paragraph")
             text = element.get("text", "")
 
-            if el_type == "heading1":
-                doc.add_heading(text, level=1)
-            elif el_type == "heading2":
-                doc.add_heading(text, level=2)
-            elif el_type == "heading3":
-                doc.add_heading(text, level=3)
+            if el_type in DOCX_HEADING_STYLES:
+                self._write_docx_paragraph(body, text, DOCX_HEADING_STYLES[el_type])
             elif el_type == "bullet_list":
                 items = element.get("items", [])
                 for item in items:
-                    doc.add_paragraph(item, style='List Bullet')
+                    self._write_docx_paragraph(body, item, "ListBullet")
             elif el_type == "numbered_list":
                 items = element.get("items", [])
                 for item in items:
-                    doc.add_paragraph(item, style='List Number')
+                    self._write_docx_paragraph(body, item, "ListNumber")
             else:
-                doc.add_paragraph(text)
+                self._write_docx_paragraph(body, text)
 
-        buffer = io.BytesIO()
-        doc.save(buffer)
+        body.write(DOCX_DOCUMENT_TAIL)
+
+        buffer = io.BytesIO(self._docx_template)
+        with zipfile.ZipFile(
+            buffer, "a", zipfile.ZIP_DEFLATED, compresslevel=self.DOCX_COMPRESSLEVEL
+        ) as docx:
+            docx.writestr("word/document.xml", body.getvalue())
         buffer.seek(0)
         return buffer
 
+    @staticmethod
+    def _write_docx_paragraph(body: io.StringIO, text: str, style: str = "") -> None:
+        """Writes one <w:p>, turning newlines into line breaks like python-docx does."""
+        body.write("<w:p>")
+        if style:
+            body.write(f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>')
+        body.write("<w:r>")
+        lines = _XML_INVALID_RE.sub("", str(text or "")).split("\n")
+        for idx, line in enumerate(lines):
+            if idx:
+                body.write("<w:br/>")
+            body.write(f'<w:t xml:space="preserve">{escape(line)}</w:t>')
+        body.write("</w:r></w:p>")
+
     # ── PDF ────────────────────────────────────────────────────────────
 
     def generate_pdf(self, structure: Dict[str, Any]) -> io.BytesIO:
-        """Generates a PDF file from the structured JSON data using fpdf2."""
-        pdf = FPDF()
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-
-        # Use built-in fonts (no external font files needed)
-        pdf.set_font("Helvetica", size=11)
+        """Generates a PDF file from the structured JSON data using ReportLab Platypus."""
+        story: List[Any] = []
 
         elements = structure.get("elements", [])
 
@@ -70,35 +180,38 @@ class DocumentService:
             el_type = element.get("type", "paragraph")
             text = element.get("text", "")
 
-            if el_type in ("heading1", "heading2", "heading3"):
-                sizes = {"heading1": 22, "heading2": 18, "heading3": 14}
-                pdf.set_font("Helvetica", style="B", size=sizes[el_type])
-                pdf.ln(4)
-                pdf.multi_cell(0, 10, text)
-                pdf.ln(2)
-                pdf.set_font("Helvetica", size=11)
+            if el_type in PDF_HEADING_STYLES:
+                story.append(Paragraph(self._pdf_markup(text), PDF_HEADING_STYLES[el_type]))
 
-            elif el_type == "bullet_list":
+            elif el_type in ("bullet_list", "numbered_list"):
                 items = element.get("items", [])
-                for item in items:
-                    pdf.set_x(pdf.l_margin + 10)
-                    pdf.multi_cell(0, 7, f"\u2022  {item}")
-
-            elif el_type == "numbered_list":
-                items = element.get("items", [])
-                for idx, item in enumerate(items, 1):
-                    pdf.set_x(pdf.l_margin + 10)
-                    pdf.multi_cell(0, 7, f"{idx}.  {item}")
+                if not items:
+                    continue
+                story.append(ListFlowable(
+                    [ListItem(Paragraph(self._pdf_markup(item), PDF_BODY_STYLE)) for item in items],
+                    bulletType="bullet" if el_type == "bullet_list" else "1",
+                    bulletFontName="Helvetica",
+                    bulletFontSize=11,
+                    leftIndent=10 * mm,
+                ))
+                story.append(Spacer(1, 4))
 
             else:
-                pdf.multi_cell(0, 7, text)
-                pdf.ln(2)
+                story.append(Paragraph(self._pdf_markup(text), PDF_BODY_STYLE))
 
         buffer = io.BytesIO()
-        pdf.output(buffer)
+        SimpleDocTemplate(
+            buffer, pagesize=A4,
+            leftMargin=10 * mm, rightMargin=10 * mm, topMargin=10 * mm, bottomMargin=15 * mm,
+        ).build(story)
         buffer.seek(0)
         return buffer
 
+    @staticmethod
+    def _pdf_markup(text: str) -> str:
+        """Escapes text for ReportLab's Paragraph mini-markup, keeping line breaks."""
+        return escape(_XML_INVALID_RE.sub("", str(text or ""))).replace("\n", "<br/>")
+
     # ── TXT ────────────────────────────────────────────────────────────
 
     def generate_txt(self, structure: Dict[str, Any]) -> io.BytesIO:
@@ -1,8 +1,236 @@
 import anthropic
+import httpx
+import openai
 import os
-import json
-from typing import Dict, Any, List
+import orjson
+from typing import Dict, Any, List, AsyncIterator, Tuple
 from pydantic import BaseModel
+from services.cache import StructureCache
+
+SYSTEM_PROMPT = """You are a document reconstruction expert.
+Your task is to take raw OCR text from a page and reconstruct its structure so it can be used to generate a Word document.
+
+Identify:
+- Headings (h1, h2, h3)
+- Paragraphs
+- Lists (bulleted, numbered)
+- Tables (if possible, otherwise text)
+
+Return the elements in reading order with this structure:
+{
+    "elements": [
+        {"type": "heading1", "text": "Title"},
+        {"type": "paragraph", "text": "Some text..."},
+        {"type": "bullet_list", "items": ["Item 1", "Item 2"]},
+        {"type": "heading2", "text": "Section 2"}
+    ]
+}
+"""
+
+# Forcing this tool makes Claude return the structure as schema-shaped tool
+# input rather than free text, so there is no wrapper prose to strip.
+DOCUMENT_TOOL = {
+    "name": "emit_document",
+    "description": "Emit the reconstructed document structure as an ordered list of elements.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "elements": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {
+                            "type": "string",
+                            "enum": [
+                                "heading1", "heading2", "heading3",
+                                "paragraph", "bullet_list", "numbered_list",
+                            ],
+                        },
+                        "text": {"type": "string", "description": "Text for headings and paragraphs."},
+                        "items": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Entries for bullet_list and numbered_list.",
+                        },
+                    },
+                    "required": ["type"],
+                },
+            },
+        },
+        "required": ["elements"],
+    },
+}
+
+DOCUMENT_TOOL_CHOICE = {"type": "tool", "name": DOCUMENT_TOOL["name"]}
+
+# The system prompt is identical on every call, so mark it cacheable and let
+# repeated calls reuse the server-side prefill instead of reprocessing it.
+SYSTEM_BLOCKS = [
+    {"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+]
+
+# Still required by older SDKs in the anthropic>=0.34 range; ignored once GA
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+class ElementStreamParser:
+    """
+    Incrementally parses the streamed {"elements": [...]} tool input,
+    returning each element dict as soon as its closing brace arrives.
+    Tracks bracket depth outside of strings.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.element_start = -1
+        self.seen_object = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        elements: List[Dict[str, Any]] = []
+        offset = len(self.buffer)
+        self.buffer += chunk
+
+        for i, ch in enumerate(chunk, offset):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                if self.depth > 0:
+                    self.in_string = True
+            elif ch in "{[":
+                if ch == "{" and self.depth == 0:
+                    self.seen_object = True
+                if ch == "{" and self.depth == 2:
+                    self.element_start = i
+                self.depth += 1
+            elif ch in "}]" and self.depth > 0:
+                self.depth -= 1
+                if ch == "}" and self.depth == 2 and self.element_start != -1:
+                    elements.append(orjson.loads(self.buffer[self.element_start:i + 1]))
+                    self.element_start = -1
+
+        # Drop text that can no longer be part of a pending element
+        if self.element_start == -1:
+            self.buffer = ""
+        elif self.element_start > 0:
+            self.buffer = self.buffer[self.element_start:]
+            self.element_start = 0
+
+        return elements
+
+class AnthropicBackend:
+    """Claude via the Anthropic API, using the forced emit_document tool."""
+
+    MAX_TOKENS = 4096  # Output cap for claude-3-haiku
+    # ~4 chars per token, leaving headroom for JSON markup around the text
+    MAX_BATCH_CHARS = 8000
+
+    def __init__(self):
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.model = "claude-3-haiku-20240307"
+
+    async def stream_json(self, user_content: str) -> AsyncIterator[str]:
+        """Yields the {"elements": [...]} JSON as it streams in."""
+        async with self.client.messages.stream(
+            model=self.model,
+            max_tokens=self.MAX_TOKENS,
+            system=SYSTEM_BLOCKS,
+            tools=[DOCUMENT_TOOL],
+            tool_choice=DOCUMENT_TOOL_CHOICE,
+            messages=[
+                {"role": "user", "content": user_content}
+            ],
+            extra_headers=PROMPT_CACHING_HEADERS,
+        ) as stream:
+            async for event in stream:
+                # The forced tool call streams its input as partial JSON
+                if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                    yield event.delta.partial_json
+
+            message = await stream.get_final_message()
+            if message.stop_reason == "max_tokens":
+                raise ValueError("Response truncated at max_tokens")
+
+class VllmBackend:
+    """
+    A small local model behind vLLM's OpenAI-compatible server. vLLM's
+    continuous batching and prefix caching let concurrent pages share the
+    system-prompt prefill; guided decoding keeps output on the tool schema.
+    """
+
+    # Sized for a 4k-context model: prompt + page text + echoed output
+    CONTEXT_TOKENS = 4096  # Fallback if the server doesn't report max_model_len
+    MAX_TOKENS = 2048
+    # The page text appears twice (input and echoed output), and digit- or
+    # punctuation-heavy OCR and CJK text can run at ~1 char per token, so
+    # 2 x 1500 tokens plus the prompt still fits in the worst case.
+    MAX_BATCH_CHARS = 1500
+
+    def __init__(self):
+        base_url = os.getenv("VLLM_BASE_URL", "http://vllm:8000/v1")
+        self.client = openai.AsyncOpenAI(
+            base_url=base_url,
+            api_key=os.getenv("VLLM_API_KEY", "x"),
+        )
+        self.model = os.getenv("VLLM_MODEL", "microsoft/Phi-3-mini-4k-instruct")
+        # vLLM serves /tokenize at the server root, not under /v1
+        self.tokenize_url = base_url.rstrip("/").removesuffix("/v1") + "/tokenize"
+
+    async def count_prompt_tokens(self, messages: List[Dict[str, str]]) -> Tuple[int, int]:
+        """
+        Counts the prompt's tokens with the served model's own tokenizer and
+        chat template. Returns (prompt tokens, model context length).
+        """
+        response = await self.client.post(
+            self.tokenize_url,
+            body={"model": self.model, "messages": messages},
+            cast_to=httpx.Response,
+        )
+        result = response.json()
+        return result["count"], result.get("max_model_len", self.CONTEXT_TOKENS)
+
+    async def stream_json(self, user_content: str) -> AsyncIterator[str]:
+        """Yields the {"elements": [...]} JSON as it streams in."""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content},
+        ]
+
+        # Leave room for the prompt so prompt + output fits the context window
+        input_tokens, context_tokens = await self.count_prompt_tokens(messages)
+        max_tokens = min(self.MAX_TOKENS, context_tokens - input_tokens)
+        if max_tokens <= 0:
+            raise ValueError("Page text is too long for the model's context window")
+
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            messages=messages,
+            stream=True,
+            extra_body={"guided_json": DOCUMENT_TOOL["input_schema"]},
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            if chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.choices[0].finish_reason == "length":
+                raise ValueError("Response truncated at max_tokens")
+
+LLM_BACKENDS = {
+    "anthropic": AnthropicBackend,
+    "vllm": VllmBackend,
+}
 
 class DocumentStructure(BaseModel):
     title: str
@@ -10,57 +238,149 @@ class DocumentStructure(BaseModel):
 
 class LLMService:
     def __init__(self):
-        self.api_key = os.getenv("ANTHROPIC_API_KEY")
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # LLM_PROVIDER selects the model backend: "anthropic" (default) or "vllm"
+        provider = os.getenv("LLM_PROVIDER", "anthropic")
+        if provider not in LLM_BACKENDS:
+            raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+        self._backend = LLM_BACKENDS[provider]()
+        self.cache = StructureCache()
 
-    def extract_structure(self, raw_text: str) -> Dict[str, Any]:
+    async def extract_structure(self, raw_text: str) -> Dict[str, Any]:
         """
-        Sends raw OCR text to Claude to reconstruct the document structure.
+        Sends raw OCR text to the LLM to reconstruct the document structure.
+        Results are cached by content hash, so identical pages skip the call.
         """
-        
-        system_prompt = """You are a document reconstruction expert. 
-        Your task is to take raw OCR text from a page and reconstruct its structure into a JSON format that can be used to generate a Word document.
-        
-        Identify:
-        - Headings (h1, h2, h3)
-        - Paragraphs
-        - Lists (bulleted, numbered)
-        - Tables (if possible, otherwise text)
-        
-        Return ONLY valid JSON with this structure:
-        {
-            "elements": [
-                {"type": "heading1", "text": "Title"},
-                {"type": "paragraph", "text": "Some text..."},
-                {"type": "bullet_list", "items": ["Item 1", "Item 2"]},
-                {"type": "heading2", "text": "Section 2"}
-            ]
-        }
+        return {"elements": [element async for element in self.stream_structure(raw_text)]}
+
+    async def extract_structure_batch(self, pages: List[str]) -> Dict[str, Any]:
         """
+        Reconstructs the structure of several pages in a single LLM call.
+        Returns one combined structure whose elements follow page order.
+        Use batch_pages() to keep each call within the model's limits.
+        """
+        return {"elements": [element async for element in self.stream_structure_batch(pages)]}
 
-        message = self.client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=4096,
-            system=system_prompt,
-            messages=[
-                {"role": "user", "content": f"Here is the raw text:\n\n{raw_text}"}
-            ]
+    def stream_structure(self, raw_text: str) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of extract_structure that yields elements as they arrive."""
+        return self._stream_elements(raw_text, f"Here is the raw text:\n\n{raw_text}")
+
+    def stream_structure_batch(self, pages: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of extract_structure_batch that yields elements as they arrive."""
+        if len(pages) == 1:
+            return self.stream_structure(pages[0])
+
+        body = "".join(
+            f"\n\n===PAGE {num}===\n{text}" for num, text in enumerate(pages, 1)
         )
+        user_content = (
+            f"Here is the raw text of {len(pages)} consecutive pages, each starting "
+            "with a ===PAGE N=== marker. Emit a single list of elements covering "
+            "every page in page order. Do not include the page markers in the "
+            f"output.{body}"
+        )
+        return self._stream_elements(body, user_content)
+
+    def batch_pages(self, pages: List[str]) -> List[List[str]]:
+        """
+        Groups consecutive pages into batches for extract_structure_batch.
+
+        The model echoes the page text back as JSON, so a batch is bounded by
+        the output limit (max_tokens), not the much larger input window.
+        Pages over the limit are split into consecutive pieces first.
+        """
+        limit = self._backend.MAX_BATCH_CHARS
+        batches: List[List[str]] = []
+        current: List[str] = []
+        current_chars = 0
+
+        for page in pages:
+            for text in self._split_page(page, limit):
+                if current and current_chars + len(text) > limit:
+                    batches.append(current)
+                    current, current_chars = [], 0
+                current.append(text)
+                current_chars += len(text)
+
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _split_page(text: str, limit: int) -> List[str]:
+        """Splits text into pieces of at most `limit` chars, on line breaks where possible."""
+        if len(text) <= limit:
+            return [text]
+
+        pieces: List[str] = []
+        current = ""
+        for line in text.splitlines(keepends=True):
+            while len(line) > limit:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(line[:limit])
+                line = line[limit:]
+            if len(current) + len(line) > limit:
+                pieces.append(current)
+                current = ""
+            current += line
+
+        if current:
+            pieces.append(current)
+        return pieces
+
+    async def _stream_elements(self, cache_text: str, user_content: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the backend's response and yields each element as soon as it
+        is complete. The full structure is cached once the stream finishes.
+        """
+        # Different models give different structures, so keep their entries apart
+        cache_key = self.cache.key_for(f"{self._backend.model}\n{cache_text}")
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            for element in cached.get("elements", []):
+                yield element
+            return
+
+        parser = ElementStreamParser()
+        elements: List[Dict[str, Any]] = []
+        response_json = ""
 
-        response_text = message.content[0].text
-        
-        # Simple extraction of JSON
         try:
-            start = response_text.find('{')
-            end = response_text.rfind('}') + 1
-            if start == -1 or end == 0:
-                raise ValueError("No JSON found")
-            
-            json_str = response_text[start:end]
-            return json.loads(json_str)
-        except Exception as e:
-            print(f"Error parsing Claude response: {e}")
-            print(f"Response was: {response_text}")
+            async for chunk in self._backend.stream_json(user_content):
+                response_json += chunk
+                for element in parser.feed(chunk):
+                    elements.append(element)
+                    yield element
+
+            if not parser.seen_object:
+                raise ValueError("No structured output received")
+            if parser.depth != 0:
+                # A cut-off stream leaves elements unclosed; never cache it
+                raise ValueError("Structured output ended before the JSON was complete")
+
+            # The schema isn't enforced on the output, so check the whole response
+            structure = orjson.loads(response_json)
+            parsed = structure.get("elements") if isinstance(structure, dict) else None
+            if isinstance(parsed, str):
+                # Haiku sometimes returns the nested array as a JSON string,
+                # which the parser can't see into; decode it and yield it now
+                parsed = orjson.loads(parsed)
+                if not isinstance(parsed, list) or not all(isinstance(el, dict) for el in parsed):
+                    raise ValueError("Structured output has no elements list")
+                for element in parsed:
+                    elements.append(element)
+                    yield element
+            if not isinstance(parsed, list):
+                raise ValueError("Structured output has no elements list")
+            if len(parsed) != len(elements):
+                raise ValueError("Streamed elements don't match the structured output")
+        except ValueError as e:
+            print(f"Error parsing LLM response: {e}")
+            print(f"Response was: {response_json}")
             raise e
+
+        # Only pages with enough text reach the LLM, so an empty result is a
+        # model failure rather than an empty page; don't keep it around
+        if elements:
+            await self.cache.set(cache_key, {"elements": elements})